@@ -1,44 +1,187 @@
 #!/usr/bin/env python3
 
-from typing import Tuple
+from typing import List, Tuple
 import tkinter as tk
-import matplotlib.pyplot as plt
-from astropy.visualization import astropy_mpl_style
-from astropy.io import fits
-from PIL import Image, ImageTk
+import numpy as np
+from PIL import Image, ImageOps, ImageTk
 from PIL.Image import Resampling
 import subprocess
 import re
 import argparse
+import functools
 from pathlib import Path
-from itertools import cycle
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import logging
+import multiprocessing
 import shutil
+import socket
 import os
 import time
-from datetime import datetime
-import pytz
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
 import json
-from dataclasses import dataclass, asdict, field
+from dataclasses import dataclass, field
 
 RMS_HOST = 'pi@10.10.0.113'
+SSH_TIMEOUT_S = 5
+# Share one ssh connection between the check and the rsync that follows it.
+# The socket lives in the user's ~/.ssh (ssh expands the ~), not in world-writable /tmp
+SSH_OPTS = ['-o', 'ControlMaster=auto', '-o', 'ControlPath=~/.ssh/cm-%r@%h:%p', '-o', 'ControlPersist=600',
+            '-o', f'ConnectTimeout={SSH_TIMEOUT_S}']
+NOT_DUE_RECHECK_S = 60  # when no check is due, wait this long before looking at the clock again
+RETRY_MIN_S, RETRY_MAX_S = 60, 60 * 60  # backoff range for retrying a failed check
+# RMS fits names: FF_<station id>_<date>_<time>_<ms>_<frame>.fits
+FITS_NAME_RE = re.compile(r'_[A-Z]{2}[0-9A-Z]{4}_(.+)\.fits$')
+SLIDE_NAME_RE = re.compile(r'_(\d{8})_(\d{6})')
+BRUSSELS_TZ = ZoneInfo('Europe/Brussels')
+# Dutch month names, indexed by month number
+MONTH_NAMES = ('', 'januari', 'februari', 'maart', 'april', 'mei', 'juni', 'juli',
+               'augustus', 'september', 'oktober', 'november', 'december')
 
 @dataclass
 class State:
     last_dir: str = field(default='')
     last_switch: str = field(default='') # last time we switched to a new dir
     last_check: str = field(default='') # last time we checked for new images
+    next_check: float = field(default=0.0) # epoch time from which we check again
     image_dir: str = field(default='current')
 
     def save(self, filename: str):
-        with open(filename, "w") as f:
-            json.dump(asdict(self), f, indent=4)
+        # Write to a temp file and rename, so a crash mid-write never leaves a corrupt state file
+        tmp_filename = filename + ".tmp"
+        with open(tmp_filename, "w") as f:
+            # all fields are plain values, no need for the deep copy asdict makes
+            json.dump(self.__dict__, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_filename, filename)
 
     @classmethod
     def load(cls, filename: str):
         with open(filename, "r") as f:
             data = json.load(f)
-        return cls(**data)
+        state = cls(**data)
+        if state.last_check and not state.next_check:
+            # state file written before next_check was stored
+            state.next_check = next_check_time(datetime.fromisoformat(state.last_check))
+        return state
+
+
+@dataclass
+class CheckSchedule:
+    """ In-memory pacing of check_time_and_run, not saved: monotonic time of the next look at the clock
+    and the current retry backoff after a failed check """
+    next_run_monotonic: float = field(default=0.0)
+    retry_backoff_s: float = field(default=RETRY_MIN_S)
+
+
+@functools.lru_cache(maxsize=512)
+def slide_filename_to_date(filename):
+    # Extract the date and time parts, e.g. slide012_20220713_211249_360_0033024.png
+    match = SLIDE_NAME_RE.search(filename)
+    if not match:
+        # not an RMS slide name, show it as is rather than break the slideshow
+        return filename
+    date_str, time_str = match.groups()
+
+    # Build the UTC timestamp from the digits directly and convert to Europe/Brussels time
+    combined_datetime = datetime(int(date_str[:4]), int(date_str[4:6]), int(date_str[6:]),
+                                 int(time_str[:2]), int(time_str[2:4]), int(time_str[4:]), tzinfo=timezone.utc)
+    combined_datetime = combined_datetime.astimezone(BRUSSELS_TZ)
+    month_name = MONTH_NAMES[combined_datetime.month]
+
+    # Construct the new string
+    return f"{combined_datetime.day} {month_name} {combined_datetime.year} @ {combined_datetime.strftime('%H:%M')}"
+
+
+def list_files(dir_path, suffix, prefix='') -> List[str]:
+    """ Sorted paths of the files in dir_path matching prefix*suffix """
+    with os.scandir(dir_path) as entries:
+        return sorted(e.path for e in entries if e.name.startswith(prefix) and e.name.endswith(suffix))
+
+
+def prune_resize_cache(path, image_paths):
+    """ Removes cached resizes of slides that no longer exist """
+    cache_dir = os.path.join(path, '.cache')
+    if not os.path.isdir(cache_dir):
+        return
+    stems = {os.path.splitext(os.path.basename(p))[0] for p in image_paths}
+    with os.scandir(cache_dir) as entries:
+        for entry in entries:
+            # cache files are named <slide stem>.<width>x<height>.png
+            if entry.name.split('.', 1)[0] not in stems:
+                os.remove(entry.path)
+
+
+def slides_fingerprint(path) -> frozenset:
+    """ Names and mtimes of the slides, changes whenever a slide is added, removed or rewritten """
+    with os.scandir(path) as entries:
+        return frozenset((e.name, e.stat().st_mtime_ns) for e in entries
+                         if e.name.startswith('slide') and e.name.endswith('.png'))
+
+
+def png_path_for(fits_file, number, path) -> str:
+    """ The slide png that convert_fits writes for this fits file, which must match FITS_NAME_RE """
+    # Extract the part after the station id, e.g. FF_BE000D_20220713_211249_360_0033024.fits
+    timestring = FITS_NAME_RE.search(os.path.basename(fits_file)).group(1)
+    return os.path.join(path, f"slide{number:03d}_{timestring}.png")
+
+
+def resize_image(img, max_width, max_height):
+    """Resizes an image proportionally to fit within the given width and height, centered on a black canvas of that size.
+    Shrinks `img` in place."""
+    if img.size == (max_width, max_height):
+        return img
+    # thumbnail keeps the aspect ratio, never upscales, and lets the decoder draft and box-reduce
+    # by integer factors before the bilinear pass. Only the displayed copy is resampled.
+    img.thumbnail((max_width, max_height), Resampling.BILINEAR)
+    # slides are grayscale, an 'L' canvas is a third of the size of RGB to decode and hand to Tk
+    new_img = Image.new("L", (max_width, max_height))
+    new_img.paste(img, ((max_width - img.width) // 2, (max_height - img.height) // 2))
+    return new_img
+
+
+def convert_fits(fits_file, number, path, size):
+    # f = '/Users/mike/dev/astropolis/cams-slideshow/data/BE000D_20220713_205043_342065_detected/FF_BE000D_20220713_211249_360_0033024.fits'
+    # astropy takes seconds to import on the Pi, only pay for it when there is something to convert
+    from astropy.io import fits
+
+    # Map the file and only pull in the image extension, copied out as float32 before the file closes.
+    # The stored integers are used unscaled: astropy can't memmap BZERO/BSCALE data, and the
+    # percentile stretch below gives the same result either way.
+    with fits.open(fits_file, memmap=True, do_not_scale_image_data=True) as hdul:
+        raw = np.asarray(hdul[1].data)
+        # Percentiles on the native 8/16 bit data, partitioning that is cheaper than a float copy
+        lo, hi = np.percentile(raw, (0.5, 99.5))
+        image_data = raw.astype(np.float32)
+
+    # Stretch the grayscale data to 8 bit, clipping the extreme percentiles.
+    # In place, so no full-frame temporaries are allocated. The percentiles interpolate, so hi - lo can be
+    # a small fraction on low-contrast frames; the epsilon only guards a flat frame (hi == lo)
+    np.subtract(image_data, lo, out=image_data)
+    np.multiply(image_data, 255.0 / max(hi - lo, 1e-6), out=image_data)
+    np.clip(image_data, 0, 255, out=image_data)
+    # Render straight at display resolution, so the slideshow can show it without resizing.
+    # contain also scales up: resize_image only shrinks, a 1280x720 frame would stay small on a larger screen
+    img = ImageOps.contain(Image.fromarray(image_data.astype(np.uint8), mode='L'), size, Resampling.BILINEAR)
+    img = resize_image(img, *size)
+
+    output_filename = png_path_for(fits_file, number, path)
+    logging.debug("converting %s to %s", fits_file, output_filename)
+    # Write to a temp file and rename: a slide newer than its fits is never converted again,
+    # so a torn write must not end up under the final name
+    tmp_filename = output_filename + ".tmp"
+    img.save(tmp_filename, format='PNG', compress_level=1)
+    os.replace(tmp_filename, output_filename)
+
+
+def _convert_one(job):
+    """ ProcessPoolExecutor worker, needs to live at module level to be picklable """
+    number, fits_file, path, size = job
+    try:
+        convert_fits(fits_file, number, path, size)
+    except Exception as e:
+        logging.error("could not convert %s, %s", fits_file, e)
 
 
 class Application():
@@ -56,6 +199,15 @@ class Application():
         self.window.attributes("-fullscreen", full_screen)
         self.current_slide = tk.Label(bg="black", highlightbackground='black', highlightcolor='black', highlightthickness=1)
         self.duration_ms = 5000
+        self.slide_size = None
+        self.photo = None
+        self.prefetcher = ThreadPoolExecutor(max_workers=1)
+        self.prefetched = None
+        self.next_tick = None  # monotonic time the next slide is due
+        self.after_id = None
+        self.slide_index = -1
+        self.slides_key = None  # (screen size, slides_fingerprint) the current image list was built for
+        self.check_schedule = CheckSchedule()
         # Create a label with text, specifying the font size and color
         self.text_label = tk.Label(self.window, text="", font=("Arial", 24), fg="white", bg="black", anchor="nw")
         # Position the label in the top left corner
@@ -65,6 +217,8 @@ class Application():
         self.window.bind("<Escape>", self.exit_fullscreen)
         self.window.bind("<Return>", self.exit_fullscreen)  # Enter key
         self.window.bind("<space>", self.exit_fullscreen)  # Space key
+        self.window.bind("<Right>", self.next_slide)
+        self.window.bind("<Left>", self.previous_slide)
         self.current_slide.pack()
 
     def exit_fullscreen(self, event=None):
@@ -73,161 +227,202 @@ class Application():
         # Or to close the application, uncomment the next line
         self.window.destroy()
 
-    def slide_filename_to_date(self, filename):
-        # Extract the date and time parts
-        date_str, time_str = filename.split('_')[1:3]
-
-        # Parse the date and time parts
-        date_obj = datetime.strptime(date_str, '%Y%m%d')
-        time_obj = datetime.strptime(time_str, '%H%M%S').time()
-
-        # Combine date and time into a single datetime object
-        combined_datetime = datetime.combine(date_obj, time_obj).replace(tzinfo=pytz.UTC)
-
-        # Convert to Europe/Brussels time
-        brussels_tz = pytz.timezone('Europe/Brussels')
-        combined_datetime = combined_datetime.astimezone(brussels_tz)
-
-        # Map month numbers to Dutch month names
-        month_names = {
-            1: 'januari', 2: 'februari', 3: 'maart', 4: 'april',
-            5: 'mei', 6: 'juni', 7: 'juli', 8: 'augustus',
-            9: 'september', 10: 'oktober', 11: 'november', 12: 'december'
-        }
-        month_name = month_names[combined_datetime.month]
-
-        # Construct the new string
-        return f"{combined_datetime.day} {month_name} {combined_datetime.year} @ {combined_datetime.strftime('%H:%M')}"
-
-    def resize_image(self, img, max_width, max_height):
-        """Resizes an image proportionally to fit within the given width and height."""
-        width, height = img.size
-        aspect_ratio = width / height
-        new_width = min(max_width, width)
-        new_height = int(new_width / aspect_ratio)
-
-        if new_height > max_height:
-            new_height = min(max_height, height)
-            new_width = int(new_height * aspect_ratio)
-
-        resized_img = img.resize((new_width, new_height), Resampling.BICUBIC)
-        new_img = Image.new("RGB", (width, height))
-        new_img.paste(resized_img, ((width - new_width) // 2, (height - new_height) // 2))
-        return new_img
-
-    def convert_fits(self, fits_file, number, path):
-        plt.style.use(astropy_mpl_style)
-        # f = '/Users/mike/dev/astropolis/cams-slideshow/data/BE000D_20220713_205043_342065_detected/FF_BE000D_20220713_211249_360_0033024.fits'
-
-        image_data = fits.getdata(fits_file, ext=1)
-
-        plt.figure()
-        plt.imshow(image_data, cmap='gray')
-        plt.axis('off')  # Turn off the axis
+    def show_slide_after(self, step):
+        """ Shows the slide `step` places from the current one right away and restarts the slide timer """
+        if self.after_id is not None:
+            self.window.after_cancel(self.after_id)
+        # display_next_slide advances by one itself
+        self.slide_index += step - 1
+        self.next_tick = None
+        self.display_next_slide()
 
-        # Extract substring after 'BE000D_' and remove '.fits' extension
-        timestring = str(fits_file).split('BE000D_')[1].replace('.fits', '')
+    def next_slide(self, event=None):
+        self.show_slide_after(1)
 
-        # Save the figure without any surrounding whitespace
-        output_filename = f"{path}/slide{number:03d}_{timestring}.png"  # specify the path where you want to save the image
-        logging.debug(f"converting {fits_file} to {output_filename}")
-        plt.savefig(output_filename, bbox_inches='tight', pad_inches=0, dpi=300)
+    def previous_slide(self, event=None):
+        self.show_slide_after(-1)
 
-        # Close the figure
-        plt.close()
+    def cached_resize(self, image_path, width, height):
+        """ resize_image, but reuses an earlier result stored in a .cache dir next to the slides """
+        cache_dir = os.path.join(os.path.dirname(image_path), '.cache')
+        stem = os.path.splitext(os.path.basename(image_path))[0]
+        cache_path = os.path.join(cache_dir, f"{stem}.{width}x{height}.png")
+        if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(image_path):
+            try:
+                img = Image.open(cache_path)
+                img.load()
+                return img
+            except OSError as e:
+                logging.warning("ignoring unreadable cached resize %s, %s", cache_path, e)
+        img = Image.open(image_path)
+        if img.size == (width, height):
+            # converted at display resolution already, nothing to cache
+            img.load()
+            return img
+        resized_img = resize_image(img, width, height)
+        os.makedirs(cache_dir, exist_ok=True)
+        # temp file and rename, a torn cache entry would otherwise be trusted for as long as the slide exists
+        tmp_path = cache_path + ".tmp"
+        resized_img.save(tmp_path, format='PNG', compress_level=1)
+        os.replace(tmp_path, cache_path)
+        return resized_img
 
     def convert_all_fits(self, path):
-        fits_files = list(Path(path).glob("*.fits"))
-        fits_files.sort()
-        for number, fits_file in enumerate(fits_files):
-            try:
-                self.convert_fits(fits_file, number, path)
-            except Exception as e:
-                logging.error(f"could not convert {fits_file}, {e}")
+        # One scandir pass gives the listing and the mtimes of both the fits files and the slides
+        with os.scandir(path) as entries:
+            mtimes = {e.path: e.stat(follow_symlinks=False).st_mtime for e in entries
+                      if e.name.endswith('.fits') or e.name.endswith('.png')}
+        fits_files = []
+        for p in sorted(p for p in mtimes if p.endswith('.fits')):
+            if FITS_NAME_RE.search(os.path.basename(p)):
+                fits_files.append(p)
+            else:
+                # without the RMS date/time in its name the slide can't be labelled
+                logging.warning("skipping %s, not an RMS fits file name", p)
+        # Skip fits files that already have a slide newer than themselves
+        jobs = [(number, fits_file, path, self.slide_size) for number, fits_file in enumerate(fits_files)
+                if mtimes.get(png_path_for(fits_file, number, path), 0) < mtimes[fits_file]]
+        logging.debug("Converting %d of %d fits files", len(jobs), len(fits_files))
+        if not jobs:
+            return
+        # forkserver: forking the Tk process while the prefetch thread runs can deadlock the workers
+        with ProcessPoolExecutor(max_workers=os.cpu_count(),
+                                 mp_context=multiprocessing.get_context('forkserver')) as executor:
+            list(executor.map(_convert_one, jobs, chunksize=4))
 
     # def are_fits_converted(self, path):
     #     fits_files = list(Path(path).glob("*.fits"))
     #     png_files = list(Path(path).glob("slide*.png"))
     #     return len(fits_files) == len(png_files)
 
-    def create_zip(self, image_paths, width, height):
-        max = len(image_paths)
-        logging.debug(f"Resizing images to {width}x{height}")
-        resized_images = (self.resize_image(Image.open(p), width, height) for p in image_paths)
-        photoimages = map(ImageTk.PhotoImage, resized_images)
-        paths_as_strings = [x.name for x in image_paths]
-        thezip = [(current, max, path_str, photoimage) for current, (path_str, photoimage) in enumerate(zip(paths_as_strings, photoimages))]
-        return thezip
-
-    def create_image_cycle(self, path):
-        image_paths = list(Path(path).glob("slide*.png"))
-        image_paths.sort()
-        width = self.window.winfo_screenwidth()
-        height = self.window.winfo_screenheight()
-        thezip = self.create_zip(image_paths, width, height)
-        return cycle(thezip)
+    def create_image_list(self, path):
+        image_paths = list_files(path, '.png', prefix='slide')
+        prune_resize_cache(path, image_paths)
+        self.slide_index = -1
+        self.prefetched = None
+        return image_paths
+
+    def load_slide(self, image_path):
+        """ Returns the resized slide, using the one prefetched in the background if available """
+        key = (image_path, self.slide_size)
+        if self.prefetched is not None and self.prefetched[0] == key:
+            return self.prefetched[1].result()
+        return self.cached_resize(image_path, *self.slide_size)
+
+    def prefetch_slide(self, image_path):
+        key = (image_path, self.slide_size)
+        self.prefetched = (key, self.prefetcher.submit(self.cached_resize, image_path, *self.slide_size))
 
     def get_correct_images(self, path):
-        updated = check_time_and_run(self.state)
+        updated = check_time_and_run(self.state, self.check_schedule)
+        # Screen rather than window size: the window grows with the slide when not full screen
+        screen_size = (self.window.winfo_screenwidth(), self.window.winfo_screenheight())
+        resized = screen_size != self.slide_size
+        self.slide_size = screen_size
         if updated:
             logging.debug("New fits were downloaded, converting them...")
             self.convert_all_fits(self.state.image_dir)
-        if updated or self.images is None:
-            logging.debug("Creating new image cycle...")
-            self.images = self.create_image_cycle(self.state.image_dir)
+        if updated or resized or self.images is None:
+            # A check without a new download leaves the slides as they were, keep the current list then
+            fingerprint = (screen_size, slides_fingerprint(self.state.image_dir))
+            if fingerprint != self.slides_key:
+                logging.debug("Creating new image list for %dx%d...", *screen_size)
+                self.images = self.create_image_list(self.state.image_dir)
+                self.slides_key = fingerprint
         return self.images
 
     def display_next_slide(self):
+        try:
+            self.show_next_slide()
+        except Exception as e:
+            # An unreadable slide is skipped, it must not stop the slideshow or the app
+            logging.error("Could not show slide: %s", e)
+        self.schedule_next_slide()
+
+    def show_next_slide(self):
         try:
             self.images = self.get_correct_images(self.state.image_dir)
         except Exception as e:
-            logging.error(f"Could not get images: {e}")
+            logging.error("Could not get images: %s", e)
             return
-        current, max, name, self.next_image = next(self.images)
-        self.text_label.config(text=f"({current+1}/{max}) {self.slide_filename_to_date(name)}")
-        self.current_slide.config(image=self.next_image)
-        self.current_slide.pack()
+        max = len(self.images)
+        if not max:
+            # nothing converted yet, look again on the next tick
+            return
+        self.slide_index = current = (self.slide_index + 1) % max
+        image_path = self.images[current]
+        name = os.path.basename(image_path)
+        next_image = self.load_slide(image_path)
+        self.text_label.config(text=f"({current+1}/{max}) {slide_filename_to_date(name)}")
+        # Reuse a single PhotoImage, only allocate a new one when the slide size changes
+        if self.photo is None or (self.photo.width(), self.photo.height()) != next_image.size:
+            self.photo = ImageTk.PhotoImage(next_image)
+        else:
+            self.photo.paste(next_image)
+        self.current_slide.config(image=self.photo)
         self.window.title(name)
-        self.window.after(self.duration_ms, self.display_next_slide)
+        # Decode the upcoming slide while this one is on screen
+        self.prefetch_slide(self.images[(current + 1) % max])
+
+    def schedule_next_slide(self):
+        # Schedule against an absolute deadline so the time spent on a slide doesn't add up to drift.
+        # When more than a whole slide behind (e.g. after a download) start over from now instead of
+        # rushing through slides.
+        now = time.monotonic()
+        period = self.duration_ms / 1000
+        if self.next_tick is None or now - self.next_tick > period:
+            self.next_tick = now
+        self.next_tick += period
+        self.after_id = self.window.after(max(0, int((self.next_tick - now) * 1000)), self.display_next_slide)
 
     def start(self):
         logging.debug("Starting slideshow")
         self.display_next_slide()
 
 
-def check_latest_dir() -> Tuple[str, int]:
-    """ Gets the most recent dir via ssh + number of fits files in it """
-    # SSH into the machine and list the directories in the specified folder
-    cmd = f"ssh {RMS_HOST} 'ls RMS_data/ArchivedFiles'"
-    result = subprocess.check_output(cmd, shell=True).decode("utf-8")
+def is_host_reachable(host: str = RMS_HOST, port: int = 22, timeout: float = 2) -> bool:
+    """ Plain TCP connect to the ssh port, no login or key exchange """
+    try:
+        with socket.create_connection((host.split('@', 1)[-1], port), timeout=timeout):
+            return True
+    except OSError:
+        return False
 
-    # Convert the result to a list of directories
-    directories = result.splitlines()
 
-    # Find the latest directory based on the naming convention
-    directories.sort(key=lambda x: (re.search(r'(\d{4})(\d{2})(\d{2})', x).groups() if re.search(r'(\d{4})(\d{2})(\d{2})', x) else (0,0,0)), reverse=True)
-    latest_directory = directories[0]
-    logging.info(f"latest_directory found: {latest_directory}")
+def check_latest_dir() -> Tuple[str, int]:
+    """ Gets the most recent dir via ssh + number of fits files in it """
+    # One ssh session: pick the latest dir (names start with station + date, so they sort by date)
+    # and count the fits files in it. Only list dirs: each night also has a <dir>.tar.bz2 next to it,
+    # which would sort first.
+    remote_cmd = ('cd RMS_data/ArchivedFiles && latest=$(ls -1rd */ | head -1) && latest=${latest%/} && '
+                  'echo "$latest" && ls "$latest"/*.fits 2>/dev/null | wc -l')
+    # An unreachable host fails here within SSH_TIMEOUT_S
+    result = subprocess.check_output(['ssh', *SSH_OPTS, RMS_HOST, remote_cmd],
+                                     text=True, timeout=SSH_TIMEOUT_S * 3)
 
-    # find out if there are any fits files
-    cmd = f"ssh {RMS_HOST} 'ls RMS_data/ArchivedFiles/{latest_directory}/*.fits | wc -l'"
-    result = subprocess.check_output(cmd, shell=True).decode("utf-8")
-    nr_fits = int(result)
-    return latest_directory, nr_fits
+    latest_directory, nr_fits = result.splitlines()
+    logging.info("latest_directory found: %s", latest_directory)
+    return latest_directory, int(nr_fits)
 
 
 def fetch_latest_dir(latest_dir: str) -> str:
     os.makedirs('latest', exist_ok=True)
 
     # Use rsync to fetch the latest directory
-    rsync_cmd = f'rsync -r -av --delete -v -e ssh "{RMS_HOST}:/home/pi/RMS_data/ArchivedFiles/{latest_dir}/*.fits" ./latest/'
+    # argv list, no local shell. Sync the dir itself and filter on *.fits, so --delete also applies
+    # fits compress well: let rsync compress (cheap level) instead of ssh, resume partial files in place
+    # -W: the night's files are new, the delta algorithm would only burn CPU on the Pi
+    # no -v: the per-file listing only slows rsync down on the Pi's link, errors are still reported
+    rsync_cmd = ['rsync', '-a', '-W', '-z', '--compress-level=1', '--partial', '--inplace', '--delete',
+                 '--include=*.fits', '--exclude=*',
+                 '-e', ' '.join(['ssh', *SSH_OPTS, '-o', 'Compression=no']),
+                 f'{RMS_HOST}:/home/pi/RMS_data/ArchivedFiles/{latest_dir}/', './latest/']
     #rsync_cmd = 'rsync -r -av --delete -v -e ./fitstest/*.fits ./latest/'
 
-    try:
-        subprocess.run(rsync_cmd, check=True, shell=True)
-        logging.debug(f"rsync_cmd: {' '.join(rsync_cmd)} - done")
-    except subprocess.CalledProcessError as e:
-        logging.error(f"rsync failed with error: {e}")
+    # A failed transfer raises and leaves latest/ in place: no switch to a partial night,
+    # and the caller's retry resumes into it
+    subprocess.run(rsync_cmd, check=True)
+    logging.debug("rsync_cmd: %s - done", ' '.join(rsync_cmd))
 
     switch_latest_dir()
 
@@ -257,26 +452,20 @@ def was_modified_today(directory_path: str) -> bool:
     current_datetime = datetime.now()
 
     # Compare the date parts
-    was_modified = mod_datetime.date() == current_datetime.date()
+    was_modified = mod_datetime.toordinal() == current_datetime.toordinal()
     #logging.debug(f"{directory_path} was modified today: {was_modified}")
     return was_modified
 
 
-def is_time_for_updating(last_check: str) -> bool:
-    """ Is it time to update the images? """
-
-    if last_check == '':
-        return True
-
-    # Get the last modification time in seconds since the epoch
-    last_check_date = datetime.fromisoformat(last_check)
+def is_time_for_updating(next_check: float, now_ts: float) -> bool:
+    """ Is it time to update the images? `next_check` is the epoch time set after the last check """
+    return now_ts >= next_check
 
-    # Get the current time and date
-    current_datetime = datetime.now()
 
-    # are we still in the same day?
-    is_same_day = last_check_date.date() == current_datetime.date()
-    return not is_same_day
+def next_check_time(now: datetime) -> float:
+    """ Epoch time of the next daily check, tomorrow at 9:00 """
+    tomorrow = now.date() + timedelta(days=1)
+    return datetime(tomorrow.year, tomorrow.month, tomorrow.day, 9).timestamp()
 
 
 def touch_directory(directory_path: str, offset_sec=0):
@@ -284,26 +473,41 @@ def touch_directory(directory_path: str, offset_sec=0):
     os.utime(directory_path, (dir_time, dir_time))
 
 
-def check_time_and_run(state) -> bool:
+def check_time_and_run(state, schedule: CheckSchedule) -> bool:
     """ Checks if it's time to run the script, returns True if we ran it """
+    # Cheap gate so most slide ticks don't even look at the wall clock
+    if time.monotonic() < schedule.next_run_monotonic:
+        return False
+
     now = datetime.now()
+    if now.hour < 9 or not is_time_for_updating(state.next_check, now.timestamp()):
+        schedule.next_run_monotonic = time.monotonic() + NOT_DUE_RECHECK_S
+        return False
 
-    if now.hour >= 9 and is_time_for_updating(state.last_check):
-        try:
-            latest_dir, nr_fits = check_latest_dir()
-            state.last_check = now.isoformat()
-            if latest_dir != state.last_dir and nr_fits > 4:
-                logging.debug(f"Copying images: {nr_fits} fits files in {latest_dir=}")
-                fetch_latest_dir(latest_dir)
-                state.last_switch = state.last_check
-            else:
-                logging.debug(f"Not Copying images: {nr_fits} fits files in {latest_dir}, last_dir was {last_dir}")
-            state.last_dir = latest_dir
-            state.save('latest_state.json')
-            logging.info(f"Wrote new last_dir: {state=}")
-            return True
-        except Exception as e:
-            logging.error(f"Could not check latest dir: {e}")
+    try:
+        # An unreachable Pi fails this probe in a fraction of the ssh connect timeout
+        if not is_host_reachable():
+            raise ConnectionError(f"{RMS_HOST} is not reachable")
+        latest_dir, nr_fits = check_latest_dir()
+        if latest_dir != state.last_dir and nr_fits > 4:
+            logging.debug("Copying images: %d fits files in latest_dir=%r", nr_fits, latest_dir)
+            # Raises if rsync fails, before last_dir and next_check move on, so the night is fetched again
+            fetch_latest_dir(latest_dir)
+            state.last_switch = now.isoformat()
+        else:
+            logging.debug("Not Copying images: %d fits files in %s, last_dir was %s", nr_fits, latest_dir, state.last_dir)
+        state.last_check = now.isoformat()
+        state.next_check = next_check_time(now)
+        state.last_dir = latest_dir
+        state.save('latest_state.json')
+        logging.info("Wrote new last_dir: state=%r", state)
+        schedule.retry_backoff_s = RETRY_MIN_S
+        return True
+    except Exception as e:
+        logging.error("Could not check latest dir: %s, retrying in %ds", e, schedule.retry_backoff_s)
+        # Don't hit an unreachable Pi (and its ssh timeout) again on every slide tick
+        schedule.next_run_monotonic = time.monotonic() + schedule.retry_backoff_s
+        schedule.retry_backoff_s = min(schedule.retry_backoff_s * 2, RETRY_MAX_S)
     return False
 
 
@@ -330,16 +534,16 @@ if __name__ == "__main__":
     if os.path.exists('latest_state.json'):
         state = State.load('latest_state.json')
 
-    logging.info(f"Starting with {state=}")
+    logging.info("Starting with state=%r", state)
 
     if args.image_directory and not Path(args.image_directory).is_dir():
-        logging.debug(f"Error: {args.image_directory} is not a valid directory.")
+        logging.debug("Error: %s is not a valid directory.", args.image_directory)
         exit(1)
 
     if args.fetch_latest_images:
         logging.info("Fetching images")
         latest_dir, nr_fits = check_latest_dir()
-        logging.info(f"latest_dir: {latest_dir}, {nr_fits=}")
+        logging.info("latest_dir: %s, nr_fits=%d", latest_dir, nr_fits)
         if nr_fits > 0:
             fetch_latest_dir(latest_dir)
             logging.info("Successfully fetched latest images")